@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Archive Compaction Job
+
+Compacts the append-only .jsonl.zst segment files written by the collector
+into a single deduplicated .json.zst archive per day. Intended to run once
+per day (e.g. just after midnight via cron); it is idempotent and skips
+today's segment, which the collector may still be appending to.
+
+Usage:
+    python compact.py
+"""
+
+import bisect
+import logging
+import os
+import sys
+from operator import itemgetter
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import orjson
+import zstandard
+
+DATA_PATH = Path('data')
+
+# Field order of the archived message record (see parser.build_message_record)
+MESSAGE_FIELDS = (
+    'id', 'date', 'text', 'views', 'forwards', 'edit_date', 'reactions',
+    'has_media', 'media_type', 'fwd_from', 'raw'
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+_zstd_compressor = zstandard.ZstdCompressor(level=3)
+_zstd_decompressor = zstandard.ZstdDecompressor()
+
+
+def _json_default(obj):
+    """Fallback serializer for types orjson doesn't handle natively"""
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='replace')
+    raise TypeError
+
+
+def load_segment_messages(filepath: Path) -> List[Dict[str, Any]]:
+    """Load all messages from a .jsonl.zst segment file"""
+    with open(filepath, 'rb') as raw:
+        with _zstd_decompressor.stream_reader(raw, read_across_frames=True) as f:
+            return [orjson.loads(line) for line in f.read().splitlines() if line]
+
+
+def compact_segment(channel_path: Path, segment_file: Path) -> None:
+    """Compact one day's segment file into a deduplicated .json.zst archive"""
+    day_str = segment_file.name.removesuffix('.jsonl.zst')
+    output_file = channel_path / f"{day_str}.json.zst"
+
+    messages = load_segment_messages(segment_file)
+
+    # Each appended batch is already sorted, so the segment is a handful of
+    # ascending runs - Timsort merges those in near-linear time. Sorting
+    # first makes duplicates adjacent, so deduping is a single comparison
+    # pass with no seen-ID set; stability keeps the earliest copy of an ID
+    messages.sort(key=itemgetter('id'))
+    unique_messages = []
+    last_id = None
+    for msg in messages:
+        if msg['id'] != last_id:
+            last_id = msg['id']
+            unique_messages.append(msg)
+
+    # Columnar layout: same-typed values sit next to each other, which
+    # compresses noticeably better than repeated row objects and lets
+    # readers decode single fields (e.g. just the id column)
+    columns = {
+        field: [msg.get(field) for msg in unique_messages]
+        for field in MESSAGE_FIELDS
+    }
+
+    file_data = {
+        'metadata': {
+            'collection_timestamp': datetime.now().isoformat(),
+            'channel_username': channel_path.name,
+            'total_messages': len(unique_messages),
+            'min_id_in_batch': unique_messages[0]['id'],
+            'max_id_in_batch': unique_messages[-1]['id'],
+            'date': day_str,
+            'format': 'columnar'
+        },
+        'columns': columns
+    }
+
+    # Compacted archives are machine-read only - skip pretty-printing.
+    # Write-then-rename so an interrupted run can't leave a truncated
+    # zstd stream under the archive's final name
+    payload = orjson.dumps(file_data, default=_json_default)
+    tmp_file = output_file.with_name(output_file.name + '.tmp')
+    with open(tmp_file, 'wb') as raw:
+        with _zstd_compressor.stream_writer(raw) as f:
+            f.write(payload)
+    os.replace(tmp_file, output_file)
+
+    # Point the index at the compacted archive
+    index_file = channel_path / 'index.json'
+    if index_file.exists():
+        try:
+            index = orjson.loads(index_file.read_bytes())
+        except orjson.JSONDecodeError:
+            logger.warning(f"index.json corrupted in {channel_path}, skipping index update")
+            index = None
+
+        if index is not None:
+            file_info = {
+                'filename': output_file.name,
+                'date': day_str,
+                'posts_count': len(unique_messages)
+            }
+            # A crashed or re-run compaction may find the archive already
+            # registered under its final name, so match both; unmatched
+            # entries go in sorted position - the collector's bisect
+            # lookup relies on data_files staying sorted by filename
+            data_files = index.setdefault('data_files', [])
+            target_names = (segment_file.name, output_file.name)
+            for i, entry in enumerate(data_files):
+                if entry['filename'] in target_names:
+                    data_files[i] = file_info
+                    break
+            else:
+                filenames = [entry['filename'] for entry in data_files]
+                data_files.insert(bisect.bisect_left(filenames, output_file.name), file_info)
+            index_file.write_bytes(orjson.dumps(index, option=orjson.OPT_INDENT_2))
+
+    # Only remove the segment after the compacted archive is fully written
+    segment_file.unlink()
+    logger.info(
+        f"[{channel_path.name}] Compacted {segment_file.name} -> "
+        f"{output_file.name} ({len(unique_messages)} messages)"
+    )
+
+
+def compact_channel(channel_path: Path) -> None:
+    """Compact all finished segment files for a single channel"""
+    today_segment = f"{date.today().isoformat()}.jsonl.zst"
+
+    # os.scandir reads the directory in one pass without the per-entry
+    # stat calls and Path allocations Path.glob would make
+    with os.scandir(channel_path) as it:
+        segment_names = sorted(e.name for e in it if e.name.endswith('.jsonl.zst'))
+
+    for segment_name in segment_names:
+        if segment_name == today_segment:
+            # The collector may still be appending to today's segment
+            continue
+        try:
+            compact_segment(channel_path, channel_path / segment_name)
+        except Exception as e:
+            logger.error(f"[{channel_path.name}] Failed to compact {segment_name}: {e}")
+
+
+def main() -> int:
+    if not DATA_PATH.exists():
+        logger.error(f"Data directory {DATA_PATH} not found")
+        return 1
+
+    with os.scandir(DATA_PATH) as it:
+        channel_names = sorted(e.name for e in it if e.is_dir())
+
+    for channel_name in channel_names:
+        compact_channel(DATA_PATH / channel_name)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,32 +1,29 @@
+import io
 import os
-import json
+import bisect
+import sys
 import gzip
+from array import array
+import pickle
+import threading
 import logging
 from logging.handlers import RotatingFileHandler
 from datetime import datetime, date
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
+import orjson
+import zstandard
 from telethon import TelegramClient
 from telethon.errors import FloodWaitError
 import asyncio
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type,
-    before_sleep_log
-)
-
-
-class DateTimeEncoder(json.JSONEncoder):
-    """Custom JSON encoder for datetime objects"""
-    def default(self, obj):
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        if isinstance(obj, bytes):
-            return obj.decode('utf-8', errors='replace')
-        return super().default(obj)
+
+
+def _json_default(obj):
+    """Fallback serializer for types orjson doesn't handle natively"""
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='replace')
+    raise TypeError
 
 load_dotenv()
 
@@ -117,28 +114,90 @@ def get_channel_logger(channel_username: str) -> logging.Logger:
 # Setup logging
 logger = setup_logging()
 
-# Environment variables
-API_ID = os.getenv('API_ID')
-API_HASH = os.getenv('API_HASH')
-PHONE_NUMBER = os.getenv('PHONE_NUMBER')
-TARGET_CHANNELS = os.getenv('TARGET_CHANNELS').split(',')
+# Tunables with safe defaults, read at import so module helpers can use them
 INITIAL_FETCH_LIMIT = int(os.getenv('INITIAL_FETCH_LIMIT', '5000'))
-
-client = TelegramClient(str(SESSION_PATH), API_ID, API_HASH)
+# Store the full Telethon message dict under 'raw' (inflates archives 5-10x)
+STORE_RAW = os.getenv('STORE_RAW', '0') == '1'
+# Seconds Telethon sleeps between 100-message history requests. Telethon
+# defaults to a conservative auto-throttle on large fetches; 0 runs the
+# requests back to back and relies on our FloodWaitError handling to back
+# off when Telegram actually pushes back.
+FETCH_WAIT_TIME = float(os.getenv('FETCH_WAIT_TIME', '0'))
+# Seconds between collection cycles; 0 = run once and exit (cron mode).
+# In loop mode the Telegram session and index cache stay resident, so
+# repeat cycles skip the MTProto handshake and index re-reads.
+RUN_INTERVAL = int(os.getenv('RUN_INTERVAL', '0'))
+
+# Cap concurrent channel fetches to stay below Telegram's per-account limits
+MAX_CONCURRENT_CHANNELS = int(os.getenv('CHANNEL_CONCURRENCY', '4'))
+
+# Telegram client, created in create_client() when running as a script.
+# Importing this module (e.g. for the compaction job or tests) must not
+# open a session file or validate credentials.
+client: Optional[TelegramClient] = None
+
+# Semaphore guarding concurrent fetch_channel runs (created lazily in main
+# so it binds to the running event loop)
+channel_semaphore: Optional[asyncio.Semaphore] = None
+
+# Loop-clock timestamp until which all fetches should hold off. Telegram's
+# flood limits are per-account, not per-channel, so when one channel gets
+# a FloodWaitError the others only deepen the penalty by pressing on.
+flood_wait_until: float = 0.0
+
+
+def create_client() -> TelegramClient:
+    """Validate credentials from the environment and build the client"""
+    api_id = os.getenv('API_ID')
+    api_hash = os.getenv('API_HASH')
+    if not all([api_id, api_hash]):
+        logger.error("Missing required environment variables (API_ID, API_HASH)!")
+        sys.exit(1)
+    return TelegramClient(str(SESSION_PATH), api_id, api_hash)
+
+# In-memory cache of per-channel index data, keyed by channel directory
+# name. Entries carry the file mtime they were read from (or written at):
+# compact.py rewrites index.json nightly when it folds segments, so the
+# cache is only trusted while the mtime still matches.
+INDEX_CACHE: Dict[str, tuple] = {}
+
+# Resolved Telethon entities keyed by channel username. get_entity on a
+# username can trigger a resolveUsername request, which counts against
+# Telegram's flood quota - resolve each channel once per process.
+ENTITY_CACHE: Dict[str, Any] = {}
+
+
+async def get_channel_entity(channel_username: str):
+    """Resolve a channel entity, reusing the per-process cache"""
+    entity = ENTITY_CACHE.get(channel_username)
+    if entity is None:
+        entity = await client.get_entity(channel_username)
+        ENTITY_CACHE[channel_username] = entity
+    return entity
 
 
 def load_index(channel_path: Path) -> Dict[str, Any]:
-    """Load index.json for a channel"""
+    """Load index.json for a channel, preferring the in-memory cache"""
     index_file = channel_path / 'index.json'
-    if index_file.exists():
+    try:
+        mtime_ns = index_file.stat().st_mtime_ns
+    except OSError:
+        mtime_ns = None
+
+    cached = INDEX_CACHE.get(channel_path.name)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    if mtime_ns is not None:
         try:
-            with open(index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+            index_data = orjson.loads(index_file.read_bytes())
+            INDEX_CACHE[channel_path.name] = (mtime_ns, index_data)
+            return index_data
+        except orjson.JSONDecodeError:
             logger.warning(f"index.json corrupted in {channel_path}. Creating a new one.")
 
     # Return a new index structure if file doesn't exist or is corrupted
-    return {
+    index_data = {
         'channel_username': channel_path.name,
         'total_posts_archived': 0,
         'last_known_id': 0,
@@ -153,25 +212,173 @@ def load_index(channel_path: Path) -> Dict[str, Any]:
             'last_check': None  # Timestamp of last gap detection check
         }
     }
+    INDEX_CACHE[channel_path.name] = (mtime_ns, index_data)
+    return index_data
 
 
 def save_index(channel_path: Path, index_data: Dict[str, Any]) -> None:
-    """Save index.json for a channel"""
+    """Save index.json for a channel and refresh the in-memory cache"""
     index_file = channel_path / 'index.json'
-    with open(index_file, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
+    # Write-then-rename keeps the old index intact if we crash mid-write.
+    # A torn index.json loses last_known_id and forces a full re-fetch of
+    # the channel, which costs far more than the extra rename
+    tmp_file = channel_path / 'index.json.tmp'
+    tmp_file.write_bytes(orjson.dumps(index_data, option=orjson.OPT_INDENT_2, default=_json_default))
+    os.replace(tmp_file, index_file)
+    INDEX_CACHE[channel_path.name] = (index_file.stat().st_mtime_ns, index_data)
+
+
+# Reusable zstd (de)compressors - construction is not free, share them.
+# The objects are not thread-safe and archive I/O runs on worker threads
+# via asyncio.to_thread, so keep one pair per thread.
+_zstd_local = threading.local()
+
+
+def _get_compressor() -> zstandard.ZstdCompressor:
+    compressor = getattr(_zstd_local, 'compressor', None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=3)
+    return compressor
+
+
+def _get_decompressor() -> zstandard.ZstdDecompressor:
+    decompressor = getattr(_zstd_local, 'decompressor', None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    return decompressor
+
+
+# Buffer size for archive file I/O. The stdlib default is 8KB; 128KB means
+# far fewer write() syscalls per multi-megabyte dump (CPython gh-117151).
+ARCHIVE_BUFFER_SIZE = 1 << 17
+
+
+def load_archive_json(filepath: Path) -> Dict[str, Any]:
+    """Load data from a .json.zst (or legacy .json.gz) archive file"""
+    with open(filepath, 'rb', buffering=ARCHIVE_BUFFER_SIZE) as raw:
+        # Sniff the container from its magic bytes rather than trusting the
+        # suffix - legacy gzip files survive renames and partial migrations
+        magic = raw.read(2)
+        raw.seek(0)
+        if magic == b'\x1f\x8b':
+            with gzip.open(raw, 'rb') as f:
+                return orjson.loads(f.read())
+        with _get_decompressor().stream_reader(raw) as f:
+            return orjson.loads(f.read())
+
+
+def append_jsonl_segment(filepath: Path, messages: List[Dict[str, Any]]) -> None:
+    """
+    Append messages to a .jsonl.zst segment file as one zstd frame.
+
+    zstd frames concatenate cleanly, so each append just adds a new frame
+    without rewriting what is already on disk.
+    """
+    lines = b''.join(
+        orjson.dumps(msg, default=_json_default) + b'\n' for msg in messages
+    )
+    with open(filepath, 'ab', buffering=ARCHIVE_BUFFER_SIZE) as raw:
+        raw.write(_get_compressor().compress(lines))
+
+
+def append_raw_sidecar(filepath: Path, raw_records: List[tuple]) -> None:
+    """
+    Append raw Telethon payloads to a .pkl.zst sidecar as one zstd frame.
+
+    Each frame holds a list of (message_id, raw_dict) pairs. Pickle
+    protocol 5 round-trips nested TL dicts several times faster than JSON
+    and keeps bytes fields intact instead of lossily decoding them.
+    """
+    payload = pickle.dumps(raw_records, protocol=5)
+    with open(filepath, 'ab', buffering=ARCHIVE_BUFFER_SIZE) as raw:
+        raw.write(_get_compressor().compress(payload))
+
+
+def iter_jsonl_segment(filepath: Path):
+    """Yield message dicts from a .jsonl.zst segment file, one at a time"""
+    with open(filepath, 'rb', buffering=ARCHIVE_BUFFER_SIZE) as raw:
+        with _get_decompressor().stream_reader(raw, read_across_frames=True) as f:
+            for line in io.BufferedReader(f):
+                if line.strip():
+                    yield orjson.loads(line)
+
+
+def columns_to_rows(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert a columnar archive document back into a list of row dicts"""
+    columns = data['columns']
+    fields = list(columns)
+    return [dict(zip(fields, values)) for values in zip(*columns.values())]
 
 
-def load_gzip_json(filepath: Path) -> Dict[str, Any]:
-    """Load data from .json.gz file"""
-    with gzip.open(filepath, 'rt', encoding='utf-8') as f:
-        return json.load(f)
+def archive_messages(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Extract message rows from any archive document layout"""
+    if isinstance(data, dict):
+        if 'columns' in data:
+            return columns_to_rows(data)
+        return data.get('messages', [])
+    return data
 
 
-def save_gzip_json(filepath: Path, data: Dict[str, Any]) -> None:
-    """Save data to .json.gz file"""
-    with gzip.open(filepath, 'wt', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
+def append_ids_file(channel_path: Path, ids: List[int]) -> None:
+    """Append message IDs to the channel's packed ids.bin index"""
+    with open(channel_path / 'ids.bin', 'ab') as f:
+        array('I', ids).tofile(f)
+
+
+def load_ids_file(channel_path: Path) -> set:
+    """Load the set of archived message IDs from ids.bin"""
+    arr = array('I')
+    arr.frombytes((channel_path / 'ids.bin').read_bytes())
+    return set(arr)
+
+
+def iter_archive_ids(filepath: Path):
+    """
+    Yield the message IDs stored in any archive file format.
+
+    Segment files decompress line by line, so only one message dict is
+    alive at a time. Legacy whole-document archives still need a full
+    parse, but the messages are dropped as soon as their IDs are read.
+    """
+    if filepath.name.endswith('.jsonl.zst'):
+        for msg in iter_jsonl_segment(filepath):
+            yield msg['id']
+        return
+    data = load_archive_json(filepath)
+    if isinstance(data, dict) and 'columns' in data:
+        # Columnar archives expose IDs as a flat int array
+        yield from data['columns']['id']
+        return
+    for msg in archive_messages(data):
+        yield msg['id']
+
+
+def ensure_ids_file(channel_path: Path, index: Dict[str, Any]) -> None:
+    """
+    One-time migration: build ids.bin for a channel collected before the
+    packed index existed.
+
+    Must run before the first append of a run - once this run's IDs land
+    in ids.bin, gap detection would take the file as complete and flag
+    every message from the unscanned archives as deleted.
+    """
+    if (channel_path / 'ids.bin').exists() or not index.get('data_files'):
+        return
+
+    # Read all data files to collect existing IDs, streaming where the
+    # format allows so only IDs (not whole message lists) stay in memory
+    existing_ids = set()
+    for file_info in index['data_files']:
+        filepath = channel_path / file_info['filename']
+        if filepath.exists():
+            try:
+                existing_ids.update(iter_archive_ids(filepath))
+            except Exception as e:
+                logger.warning(f"Failed to read {filepath} for ids.bin migration: {e}")
+
+    if existing_ids:
+        logger.info(f"Building ids.bin for {channel_path.name} ({len(existing_ids)} IDs)")
+        append_ids_file(channel_path, sorted(existing_ids))
 
 
 def detect_gaps(channel_path: Path, index: Dict[str, Any]) -> List[int]:
@@ -188,41 +395,102 @@ def detect_gaps(channel_path: Path, index: Dict[str, Any]) -> List[int]:
     if not min_known_id or not last_known_id or min_known_id >= last_known_id:
         return []
 
-    # Collect all message IDs we have
-    existing_ids = set()
-
-    # Read all data files to collect existing IDs
-    for file_info in index.get('data_files', []):
-        filepath = channel_path / file_info['filename']
-        if filepath.exists():
-            try:
-                data = load_gzip_json(filepath)
-                messages = data.get('messages', []) if isinstance(data, dict) else data
-                for msg in messages:
-                    existing_ids.add(msg['id'])
-            except Exception as e:
-                logger.warning(f"Failed to read {filepath} for gap detection: {e}")
-
-    # Find gaps in the sequence
-    expected_ids = set(range(min_known_id, last_known_id + 1))
-    missing_ids = expected_ids - existing_ids
+    # The packed ids.bin index is kept up to date on every save and
+    # backfilled from legacy archives by ensure_ids_file before the first
+    # append, so this never decompresses an archive
+    if not (channel_path / 'ids.bin').exists():
+        return []
+    existing_ids = load_ids_file(channel_path)
 
-    # Get previously known deleted IDs
+    # Find gaps by walking the sorted IDs we actually hold instead of
+    # materializing set(range(min, last + 1)) - for a channel spanning
+    # millions of IDs that set alone costs hundreds of MB of Python ints
     known_deleted = set(index.get('deleted_messages', {}).get('ids', []))
+    new_deleted_ids = []
+    prev_id = min_known_id - 1
+
+    for msg_id in sorted(existing_ids):
+        if msg_id <= prev_id or msg_id > last_known_id:
+            continue
+        if msg_id > prev_id + 1:
+            new_deleted_ids.extend(
+                missing for missing in range(prev_id + 1, msg_id)
+                if missing not in known_deleted
+            )
+        prev_id = msg_id
 
-    # Find new deleted IDs
-    new_deleted_ids = sorted(missing_ids - known_deleted)
+    # Trailing gap up to the newest known message
+    if prev_id < last_known_id:
+        new_deleted_ids.extend(
+            missing for missing in range(prev_id + 1, last_known_id + 1)
+            if missing not in known_deleted
+        )
 
+    # Built in ascending ID order, so already sorted
     return new_deleted_ids
 
 
-async def fetch_messages_batch(channel_username: str, min_id: int = None, max_id: int = None, limit: int = None, retry_count: int = 0) -> List[Dict[str, Any]]:
+def build_message_record(message) -> Dict[str, Any]:
+    """
+    Convert a Telethon message into the archived record schema.
+
+    Runs once per archived post, so attribute lookups are cached in locals
+    and the optional raw payload (message.to_dict() walks the whole TL
+    object graph) is only built when STORE_RAW is enabled.
+    """
+    edit_date = message.edit_date
+    media = message.media
+    reactions = message.reactions
+    fwd = message.fwd_from
+    # Class names repeat across virtually every message; interning makes
+    # each distinct value one shared str object instead of a fresh
+    # allocation per record
+    intern = sys.intern
+
+    # getattr with a default is one C call, versus the try/except that
+    # hasattr runs internally for every probed attribute
+    if fwd is not None:
+        fwd_id = getattr(fwd, 'from_id', None)
+        fwd_date = getattr(fwd, 'date', None)
+        fwd_from = {
+            'from_id': str(fwd_id) if fwd_id is not None else None,
+            'from_name': getattr(fwd, 'from_name', None),
+            'date': fwd_date.isoformat() if fwd_date else None
+        }
+    else:
+        fwd_from = None
+
+    record = {
+        'id': message.id,
+        'date': message.date.isoformat(),
+        'text': message.text,
+        'views': message.views,
+        'forwards': message.forwards,
+        'edit_date': edit_date.isoformat() if edit_date else None,
+        'reactions': [
+            {
+                'emoji': getattr(r.reaction, 'emoticon', None),
+                'type': intern(type(r.reaction).__name__),
+                'count': r.count
+            }
+            for r in reactions.results
+        ] if reactions else [],
+        'has_media': media is not None,
+        'media_type': intern(type(media).__name__) if media else None,
+        'fwd_from': fwd_from,
+    }
+    if STORE_RAW:
+        record['raw'] = message.to_dict()
+    return record
+
+
+async def fetch_messages_batch(channel_username: str, min_id: int = None, max_id: int = None, limit: int = None) -> List[Dict[str, Any]]:
     """
     Fetch a batch of messages and convert them to dict format.
 
     Implements exponential backoff with FloodWaitError handling:
     - Respects Telegram's wait time from FloodWaitError
-    - Saves partial progress before retry
+    - Resumes from the last collected message ID
     - Maximum 3 retry attempts
 
     Args:
@@ -230,17 +498,22 @@ async def fetch_messages_batch(channel_username: str, min_id: int = None, max_id
         min_id: Minimum message ID (exclusive)
         max_id: Maximum message ID (exclusive)
         limit: Maximum number of messages to fetch
-        retry_count: Current retry attempt (internal use)
 
     Returns:
         List of message dictionaries
     """
-    messages_data = []
+    global flood_wait_until
+
+    # Pre-size the result list when the batch size is known; appending one
+    # by one reallocates the list dozens of times over a large fetch
+    messages_data = [None] * limit if limit else []
     message_count = 0
+    progress_tick = 500
+    retry_count = 0
     max_retries = 3
 
     # Build kwargs only with non-None values
-    kwargs = {}
+    kwargs = {'wait_time': FETCH_WAIT_TIME}
     if min_id is not None:
         kwargs['min_id'] = min_id
     if max_id is not None:
@@ -248,135 +521,127 @@ async def fetch_messages_batch(channel_username: str, min_id: int = None, max_id
     if limit is not None:
         kwargs['limit'] = limit
 
-    try:
-        async for message in client.iter_messages(channel_username, **kwargs):
-            if not message or (message.text is None and message.media is None):
-                continue
-
-            # Save full raw message for future reference
-            message_dict = message.to_dict()
-
-            message_data = {
-                'id': message.id,
-                'date': message.date.isoformat(),
-                'text': message.text,
-                'views': message.views,
-                'forwards': message.forwards,
-                'edit_date': message.edit_date.isoformat() if message.edit_date else None,
-                'reactions': [
-                    {
-                        'emoji': r.reaction.emoticon if hasattr(r.reaction, 'emoticon') else None,
-                        'type': r.reaction.__class__.__name__,
-                        'count': r.count
-                    }
-                    for r in message.reactions.results
-                ] if message.reactions else [],
-                'has_media': message.media is not None,
-                'media_type': message.media.__class__.__name__ if message.media else None,
-                'fwd_from': {
-                    'from_id': str(message.fwd_from.from_id) if message.fwd_from and hasattr(message.fwd_from, 'from_id') else None,
-                    'from_name': message.fwd_from.from_name if message.fwd_from and hasattr(message.fwd_from, 'from_name') else None,
-                    'date': message.fwd_from.date.isoformat() if message.fwd_from and hasattr(message.fwd_from, 'date') else None
-                } if message.fwd_from else None,
-                'raw': message_dict
-            }
-            messages_data.append(message_data)
-            message_count += 1
-
-            # Progress indicator every 500 messages
-            if message_count % 500 == 0:
+    # Honor a flood wait triggered by a concurrent channel before adding
+    # more requests to the same account's quota
+    loop = asyncio.get_running_loop()
+    if loop.time() < flood_wait_until:
+        hold_off = flood_wait_until - loop.time()
+        logger.info(f"[{channel_username}] Holding off {hold_off:.1f}s for an account-wide flood wait")
+        await asyncio.sleep(hold_off)
+
+    # Retry iteratively on FloodWaitError rather than recursing: kwargs are
+    # adjusted in place to resume past the collected messages, so no merge
+    # or dedup pass over the partial results is ever needed
+    while True:
+        try:
+            # Passing the resolved entity skips Telethon's per-call username
+            # resolution inside iter_messages
+            entity = await get_channel_entity(channel_username)
+            # Bind the bound method once; the per-message LOAD_ATTR adds up
+            # over a large fetch (only the unlimited path appends - the
+            # pre-sized path assigns into its slots by index)
+            append = messages_data.append
+            async for message in client.iter_messages(entity, **kwargs):
+                if not message or (message.text is None and message.media is None):
+                    continue
+
+                message_data = build_message_record(message)
                 if limit:
-                    logger.info(f"[{channel_username}] Progress: {message_count}/{limit} messages")
+                    messages_data[message_count] = message_data
                 else:
-                    logger.info(f"[{channel_username}] Progress: {message_count} messages downloaded...")
+                    append(message_data)
+                message_count += 1
+
+                # Progress indicator every 500 messages; a decrementing
+                # counter swaps the per-message modulo for a cheap truth test
+                progress_tick -= 1
+                if not progress_tick:
+                    progress_tick = 500
+                    if limit:
+                        logger.info(f"[{channel_username}] Progress: {message_count}/{limit} messages")
+                    else:
+                        logger.info(f"[{channel_username}] Progress: {message_count} messages downloaded...")
+
+        except FloodWaitError as e:
+            # Telegram rate limit hit - need to wait
+            wait_seconds = e.seconds
+
+            if message_count:
+                logger.warning(
+                    f"[{channel_username}] FloodWaitError: Rate limit hit after {message_count} messages. "
+                    f"Telegram requires waiting {wait_seconds} seconds."
+                )
+            else:
+                logger.warning(
+                    f"[{channel_username}] FloodWaitError: Rate limit hit immediately. "
+                    f"Telegram requires waiting {wait_seconds} seconds."
+                )
 
-    except FloodWaitError as e:
-        # Telegram rate limit hit - need to wait
-        wait_seconds = e.seconds
+            # Check if we can retry
+            if retry_count >= max_retries:
+                logger.error(
+                    f"[{channel_username}] Maximum retry attempts ({max_retries}) reached. "
+                    f"Returning {message_count} partial messages."
+                )
+                break
 
-        if messages_data:
-            logger.warning(
-                f"[{channel_username}] FloodWaitError: Rate limit hit after {len(messages_data)} messages. "
-                f"Telegram requires waiting {wait_seconds} seconds."
-            )
-        else:
-            logger.warning(
-                f"[{channel_username}] FloodWaitError: Rate limit hit immediately. "
-                f"Telegram requires waiting {wait_seconds} seconds."
-            )
+            # Wait as Telegram requested, with exponential backoff multiplier
+            backoff_multiplier = 1.5 ** retry_count  # 1x, 1.5x, 2.25x
+            actual_wait = wait_seconds * backoff_multiplier
+            retry_count += 1
 
-        # Check if we can retry
-        if retry_count >= max_retries:
-            logger.error(
-                f"[{channel_username}] Maximum retry attempts ({max_retries}) reached. "
-                f"Returning {len(messages_data)} partial messages."
+            logger.info(
+                f"[{channel_username}] Retry attempt {retry_count}/{max_retries}. "
+                f"Waiting {actual_wait:.1f} seconds (Telegram: {wait_seconds}s + backoff)..."
             )
-            return messages_data
-
-        # Wait as Telegram requested, with exponential backoff multiplier
-        backoff_multiplier = 1.5 ** retry_count  # 1x, 1.5x, 2.25x
-        actual_wait = wait_seconds * backoff_multiplier
-
-        logger.info(
-            f"[{channel_username}] Retry attempt {retry_count + 1}/{max_retries}. "
-            f"Waiting {actual_wait:.1f} seconds (Telegram: {wait_seconds}s + backoff)..."
-        )
 
-        await asyncio.sleep(actual_wait)
-
-        logger.info(f"[{channel_username}] Resuming after wait. Collected {len(messages_data)} messages so far.")
-
-        # If we already collected some messages, adjust min_id/max_id to continue from where we stopped
-        if messages_data:
-            if max_id is not None:
-                # Going backwards (backfill)
-                new_max_id = min(msg['id'] for msg in messages_data)
-                logger.info(f"[{channel_username}] Continuing backfill from message ID {new_max_id}")
-                remaining_messages = await fetch_messages_batch(
-                    channel_username,
-                    min_id=min_id,
-                    max_id=new_max_id,
-                    limit=limit - len(messages_data) if limit else None,
-                    retry_count=retry_count + 1
-                )
-            else:
-                # Going forward (new messages)
-                new_min_id = max(msg['id'] for msg in messages_data)
-                logger.info(f"[{channel_username}] Continuing forward from message ID {new_min_id}")
-                remaining_messages = await fetch_messages_batch(
-                    channel_username,
-                    min_id=new_min_id,
-                    max_id=max_id,
-                    limit=limit - len(messages_data) if limit else None,
-                    retry_count=retry_count + 1
-                )
+            # Publish the penalty window so concurrent channels back off too
+            flood_wait_until = max(flood_wait_until, loop.time() + actual_wait)
+
+            await asyncio.sleep(actual_wait)
+
+            logger.info(f"[{channel_username}] Resuming after wait. Collected {message_count} messages so far.")
+
+            # iter_messages descends from the newest message in every
+            # mode, so the interrupted iteration stopped just below the
+            # smallest ID we hold - cap max_id there and continue the
+            # same descent (any min_id stays as the floor). Raising
+            # min_id instead would abandon the unfetched range below the
+            # interrupt for good once the index advances past it. Every
+            # resume appends strictly smaller IDs, so the last filled
+            # slot is always the minimum - no scan needed, and the bound
+            # is exclusive so nothing is re-yielded
+            if message_count:
+                kwargs['max_id'] = messages_data[message_count - 1]['id']
+                logger.info(f"[{channel_username}] Resuming below message ID {kwargs['max_id']}")
+                if limit:
+                    kwargs['limit'] = limit - message_count
+            continue
 
-            # Merge and deduplicate
-            all_messages = messages_data + remaining_messages
-            unique_messages = {msg['id']: msg for msg in all_messages}
-            return list(unique_messages.values())
-        else:
-            # No messages collected yet, just retry with same parameters
-            return await fetch_messages_batch(
-                channel_username,
-                min_id=min_id,
-                max_id=max_id,
-                limit=limit,
-                retry_count=retry_count + 1
-            )
+        except Exception as e:
+            del messages_data[message_count:]
+            logger.error(f"[{channel_username}] Unexpected error occurred: {e}", exc_info=True)
+            if messages_data:
+                logger.info(f"[{channel_username}] Returning {len(messages_data)} partial messages collected before error")
+                return messages_data
+            raise
 
-    except Exception as e:
-        logger.error(f"[{channel_username}] Unexpected error occurred: {e}", exc_info=True)
-        if messages_data:
-            logger.info(f"[{channel_username}] Returning {len(messages_data)} partial messages collected before error")
-            return messages_data
-        raise
+        break
 
+    # Fewer messages than the pre-sized limit (skipped empties or channel end)
+    del messages_data[message_count:]
     return messages_data
 
 
 async def fetch_channel(channel_username: str) -> None:
     """Fetch and store messages from a Telegram channel"""
+    # Limit how many channels are fetched at once
+    async with channel_semaphore:
+        await _fetch_channel(channel_username)
+
+
+async def _fetch_channel(channel_username: str) -> None:
+    """Do the actual fetch work for a single channel"""
     # Get channel-specific logger
     channel_logger = get_channel_logger(channel_username)
 
@@ -386,29 +651,97 @@ async def fetch_channel(channel_username: str) -> None:
     channel_path = DATA_PATH / channel_username
     channel_path.mkdir(exist_ok=True)
 
-    # Get channel info to show total posts
-    try:
-        entity = await client.get_entity(channel_username)
-        # Try to get first message to check total count
-        first_msg = await client.get_messages(entity, limit=1)
-        if first_msg and len(first_msg) > 0:
-            total_posts_in_channel = first_msg[0].id
-            logger.info(f"[{channel_username}] Total posts in channel: ~{total_posts_in_channel}")
-        else:
-            total_posts_in_channel = None
-    except Exception as e:
-        logger.warning(f"[{channel_username}] Could not get channel info: {e}")
-        total_posts_in_channel = None
+    today_str = date.today().isoformat()
 
-    # Load index to get last known message ID
-    index = load_index(channel_path)
+    # Load index to get last known message ID (off-thread: blocking file I/O
+    # would otherwise stall the event loop for every other channel)
+    index = await asyncio.to_thread(load_index, channel_path)
     last_known_id = index['last_known_id']
     min_known_id = index.get('min_known_id')
 
+    # Backfill ids.bin from pre-ids.bin archives before anything is
+    # appended this run; a no-op for channels that already have it
+    await asyncio.to_thread(ensure_ids_file, channel_path, index)
+
+    # The channel-size estimate costs two MTProto round-trips and only feeds
+    # progress logging, so reuse the cached value and refresh it once a day
+    total_posts_in_channel = index.get('estimated_total')
+    estimate_refreshed = False
+    if total_posts_in_channel is None or index.get('estimated_total_date') != today_str:
+        try:
+            entity = await get_channel_entity(channel_username)
+            # Try to get first message to check total count
+            first_msg = await client.get_messages(entity, limit=1)
+            if first_msg and len(first_msg) > 0:
+                total_posts_in_channel = first_msg[0].id
+                index['estimated_total'] = total_posts_in_channel
+                index['estimated_total_date'] = today_str
+                estimate_refreshed = True
+                logger.info(f"[{channel_username}] Total posts in channel: ~{total_posts_in_channel}")
+        except Exception as e:
+            logger.warning(f"[{channel_username}] Could not get channel info: {e}")
+
     # Show progress
     if total_posts_in_channel:
         logger.info(f"[{channel_username}] Downloaded: {index['total_posts_archived']} / ~{total_posts_in_channel} posts")
 
+    # Filename for today's data - an append-only JSON Lines segment file
+    output_filename = channel_path / f"{today_str}.jsonl.zst"
+
+    # IDs saved during this run. The index's last_known_id/min_known_id
+    # bounds already guarantee fetches don't overlap previous runs, and the
+    # compaction job dedupes by ID anyway, so today's segment is never read
+    # back here - the hot path touches no data file at all.
+    today_ids = set()
+
+    # Running stats, updated per batch instead of buffering the whole day
+    new_count = 0
+    min_id_in_batch = None
+    max_id_in_batch = None
+    first_msg_date = None
+    last_msg_date = None
+
+    async def write_batch(messages: List[Dict[str, Any]]) -> None:
+        """Append a batch to today's segment and update the running stats"""
+        nonlocal new_count, min_id_in_batch, max_id_in_batch
+        nonlocal first_msg_date, last_msg_date
+
+        if today_ids:
+            messages = [msg for msg in messages if msg['id'] not in today_ids]
+        if not messages:
+            return
+
+        messages.sort(key=lambda x: x['id'])
+
+        # Raw payloads go to a pickle sidecar so the analytics file stays
+        # small and cheap to re-read
+        if STORE_RAW:
+            raw_dir = channel_path / 'raw'
+            raw_dir.mkdir(exist_ok=True)
+            raw_records = [(msg['id'], msg.pop('raw')) for msg in messages]
+            await asyncio.to_thread(
+                append_raw_sidecar, raw_dir / f"{today_str}.pkl.zst", raw_records
+            )
+
+        # Serialization + zstd compression release the GIL on a worker thread,
+        # letting other channels keep downloading meanwhile
+        await asyncio.to_thread(append_jsonl_segment, output_filename, messages)
+        await asyncio.to_thread(
+            append_ids_file, channel_path, [msg['id'] for msg in messages]
+        )
+
+        today_ids.update(msg['id'] for msg in messages)
+        new_count += len(messages)
+
+        batch_min = messages[0]
+        batch_max = messages[-1]
+        if min_id_in_batch is None or batch_min['id'] < min_id_in_batch:
+            min_id_in_batch = batch_min['id']
+            first_msg_date = batch_min['date']
+        if max_id_in_batch is None or batch_max['id'] > max_id_in_batch:
+            max_id_in_batch = batch_max['id']
+            last_msg_date = batch_max['date']
+
     # Step 1: Fetch NEW messages (forward direction)
     new_messages_forward = []
     if last_known_id == 0:
@@ -429,6 +762,11 @@ async def fetch_channel(channel_username: str) -> None:
         else:
             logger.info(f"[{channel_username}] No new messages found")
 
+    # Stream the forward batch to disk right away and release it
+    if new_messages_forward:
+        await write_batch(new_messages_forward)
+        new_messages_forward = None
+
     # Step 2: Fetch OLD messages (backward direction - backfill)
     new_messages_backward = []
     if min_known_id and min_known_id > 1:
@@ -442,60 +780,23 @@ async def fetch_channel(channel_username: str) -> None:
         else:
             logger.info(f"[{channel_username}] No older messages to download (reached beginning of channel)")
 
-    # Combine all new messages
-    all_new_messages = new_messages_forward + new_messages_backward
+    # Stream the backfill batch to disk as well
+    if new_messages_backward:
+        await write_batch(new_messages_backward)
+        new_messages_backward = None
 
-    if not all_new_messages:
+    if new_count == 0:
+        # Persist a refreshed estimate even on idle runs; otherwise a
+        # run-once invocation re-pays the two round-trips every time
+        if estimate_refreshed:
+            await asyncio.to_thread(save_index, channel_path, index)
         logger.info(f"[{channel_username}] No new data to save")
         return
 
-    # Sort messages by ID
-    all_new_messages.sort(key=lambda x: x['id'])
-
-    # Track min and max IDs
-    min_id_in_batch = min(msg['id'] for msg in all_new_messages)
-    max_id_in_batch = max(msg['id'] for msg in all_new_messages)
-
-    # Filename for today's data
-    today_str = date.today().isoformat()
-    output_filename = channel_path / f"{today_str}.json.gz"
-
-    # Load existing messages from today's file if it exists
-    existing_today_messages = []
-    if output_filename.exists():
-        try:
-            file_data = load_gzip_json(output_filename)
-            if isinstance(file_data, dict) and 'messages' in file_data:
-                existing_today_messages = file_data['messages']
-            elif isinstance(file_data, list):
-                existing_today_messages = file_data
-        except Exception as e:
-            logger.warning(f"[{channel_username}] Failed to load {output_filename}: {e}")
-
-    # Merge messages and remove duplicates by ID
-    all_messages = existing_today_messages + all_new_messages
-    unique_messages = {msg['id']: msg for msg in all_messages}.values()
-    unique_messages = sorted(unique_messages, key=lambda x: x['id'])
-
-    # Create file data with metadata
-    file_data = {
-        'metadata': {
-            'collection_timestamp': datetime.now().isoformat(),
-            'channel_username': channel_username,
-            'total_messages': len(unique_messages),
-            'min_id_in_batch': min_id_in_batch,
-            'max_id_in_batch': max_id_in_batch,
-            'date': today_str
-        },
-        'messages': list(unique_messages)
-    }
-
-    # Save to .json.gz
-    save_gzip_json(output_filename, file_data)
-    logger.info(f"[{channel_username}] Saved {len(all_new_messages)} new messages to {output_filename}")
+    logger.info(f"[{channel_username}] Saved {new_count} new messages to {output_filename}")
 
     # Update index
-    index['total_posts_archived'] += len(all_new_messages)
+    index['total_posts_archived'] += new_count
     index['last_known_id'] = max(max_id_in_batch, index['last_known_id'])
 
     # Update min_known_id
@@ -504,35 +805,36 @@ async def fetch_channel(channel_username: str) -> None:
     else:
         index['min_known_id'] = min(min_id_in_batch, min_known_id)
 
-    index['last_updated'] = datetime.now().isoformat()
+    # One timestamp per run serves every index field updated below
+    now_iso = datetime.now().isoformat()
+    index['last_updated'] = now_iso
 
     # Update first and last post dates
-    if all_new_messages:
-        first_msg_date = all_new_messages[0]['date']
-        last_msg_date = all_new_messages[-1]['date']
-
-        if index['first_post_date'] is None or first_msg_date < index['first_post_date']:
-            index['first_post_date'] = first_msg_date
-        if index['last_post_date'] is None or last_msg_date > index['last_post_date']:
-            index['last_post_date'] = last_msg_date
-
-    # Update data_files info
-    file_info = {
-        'filename': output_filename.name,
-        'date': today_str,
-        'posts_count': len(unique_messages)
-    }
-
-    # Check if file entry already exists in index
-    existing_file_index = next((i for i, f in enumerate(index['data_files']) if f['filename'] == output_filename.name), None)
-    if existing_file_index is not None:
-        index['data_files'][existing_file_index] = file_info
+    if index['first_post_date'] is None or first_msg_date < index['first_post_date']:
+        index['first_post_date'] = first_msg_date
+    if index['last_post_date'] is None or last_msg_date > index['last_post_date']:
+        index['last_post_date'] = last_msg_date
+
+    # Update data_files info. Counts accumulate across runs within a day;
+    # compaction recomputes the exact figure when it folds the segment.
+    # Filenames are date-prefixed, so data_files stays sorted by filename
+    # and bisect finds today's entry without scanning years of dailies
+    data_files = index['data_files']
+    filenames = [f['filename'] for f in data_files]
+    i = bisect.bisect_left(filenames, output_filename.name)
+    if i < len(data_files) and filenames[i] == output_filename.name:
+        data_files[i]['posts_count'] += new_count
     else:
-        index['data_files'].append(file_info)
-
-    # Detect gaps (deleted messages)
+        data_files.insert(i, {
+            'filename': output_filename.name,
+            'date': today_str,
+            'posts_count': new_count
+        })
+
+    # Detect gaps (deleted messages). Runs off-thread: reading ids.bin (or
+    # migrating old archives) is blocking I/O that would stall the loop
     logger.info(f"[{channel_username}] Running gap detection...")
-    new_deleted_ids = detect_gaps(channel_path, index)
+    new_deleted_ids = await asyncio.to_thread(detect_gaps, channel_path, index)
 
     if new_deleted_ids:
         # Ensure deleted_messages structure exists
@@ -542,7 +844,7 @@ async def fetch_channel(channel_username: str) -> None:
         # Add newly detected deleted IDs
         index['deleted_messages']['ids'].extend(new_deleted_ids)
         index['deleted_messages']['count'] = len(index['deleted_messages']['ids'])
-        index['deleted_messages']['last_check'] = datetime.now().isoformat()
+        index['deleted_messages']['last_check'] = now_iso
 
         logger.info(f"[{channel_username}] Detected {len(new_deleted_ids)} newly deleted messages")
         if len(new_deleted_ids) <= 10:
@@ -555,7 +857,7 @@ async def fetch_channel(channel_username: str) -> None:
         # Update last_check even if no new gaps found
         if 'deleted_messages' not in index:
             index['deleted_messages'] = {'ids': [], 'count': 0, 'last_check': None}
-        index['deleted_messages']['last_check'] = datetime.now().isoformat()
+        index['deleted_messages']['last_check'] = now_iso
 
     # Show total deleted messages statistics
     total_deleted = index['deleted_messages']['count']
@@ -564,7 +866,7 @@ async def fetch_channel(channel_username: str) -> None:
         logger.info(f"[{channel_username}] Total deleted messages: {total_deleted} ({deleted_pct:.2f}% of all posts)")
 
     # Save updated index
-    save_index(channel_path, index)
+    await asyncio.to_thread(save_index, channel_path, index)
 
     # Show final progress
     if total_posts_in_channel:
@@ -574,10 +876,38 @@ async def fetch_channel(channel_username: str) -> None:
         logger.info(f"[{channel_username}] Total archived: {index['total_posts_archived']} posts")
 
 async def main():
-    await client.start(phone=PHONE_NUMBER)
-    for channel in TARGET_CHANNELS:
-        await fetch_channel(channel.strip())
+    global channel_semaphore
+    channel_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHANNELS)
+
+    target_channels = os.getenv('TARGET_CHANNELS', '')
+    channels = [channel.strip() for channel in target_channels.split(',') if channel.strip()]
+    if not channels:
+        logger.error("TARGET_CHANNELS is not set!")
+        sys.exit(1)
+
+    await client.start(phone=os.getenv('PHONE_NUMBER'))
+
+    while True:
+        # Fetch all channels concurrently so network waits overlap;
+        # the semaphore inside fetch_channel caps actual parallelism
+        results = await asyncio.gather(
+            *[fetch_channel(channel) for channel in channels],
+            return_exceptions=True
+        )
+
+        for channel, result in zip(channels, results):
+            if isinstance(result, Exception):
+                logger.error(f"[{channel}] Collection failed: {result}", exc_info=result)
+
+        if RUN_INTERVAL <= 0:
+            break
+
+        # Loop mode: keep the client connected and the index cache warm,
+        # amortizing the Telegram handshake across cycles
+        logger.info(f"Collection cycle complete. Next run in {RUN_INTERVAL}s")
+        await asyncio.sleep(RUN_INTERVAL)
 
 if __name__ == '__main__':
+    client = create_client()
     with client:
         client.loop.run_until_complete(main())
\ No newline at end of file
@@ -9,12 +9,13 @@ Continuous monitoring daemon for Telegram channels.
 """
 
 import os
-import json
-import gzip
+import atexit
 import logging
+import queue
 import signal
+import threading
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime, date, timedelta
 from pathlib import Path
 from typing import Dict, Any, List, Optional
@@ -22,16 +23,20 @@ from dotenv import load_dotenv
 from telethon import TelegramClient
 from telethon.errors import FloodWaitError
 import asyncio
+import orjson
+import zstandard
 
 
-class DateTimeEncoder(json.JSONEncoder):
-    """Custom JSON encoder for datetime objects"""
-    def default(self, obj):
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        if isinstance(obj, bytes):
-            return obj.decode('utf-8', errors='replace')
-        return super().default(obj)
+def _json_default(obj):
+    """Fallback serializer for types orjson doesn't handle natively"""
+    # orjson serializes datetime/date in C; only bytes need help
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='replace')
+    # Telethon TL objects (the raw message payload) dict-ify themselves
+    to_dict = getattr(obj, 'to_dict', None)
+    if to_dict is not None:
+        return to_dict()
+    raise TypeError
 
 
 load_dotenv()
@@ -48,8 +53,11 @@ LOGS_PATH.mkdir(exist_ok=True)
 
 # Configuration
 MONITOR_INTERVAL = 120  # Check for new posts every 2 minutes
+MAX_MONITOR_INTERVAL = 30 * 60  # Idle channels back off up to 30 minutes
 BACKFILL_INTERVAL = 6 * 3600  # Backfill old posts every 6 hours
 BACKFILL_LIMIT = int(os.getenv('BACKFILL_LIMIT', '1000'))  # Posts per backfill run
+# Store the full Telethon message dict under 'raw' (inflates archives 5-10x)
+STORE_RAW = os.getenv('STORE_RAW', '0') == '1'
 
 
 # Configure logging
@@ -78,8 +86,15 @@ def setup_logging():
     file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(formatter)
 
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
+    # Log calls from the event loop only enqueue the record; a listener
+    # thread does the formatting, disk writes and rotation, so a slow disk
+    # never stalls the async tasks mid-loop
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root_logger.addHandler(QueueHandler(log_queue))
 
     return logging.getLogger(__name__)
 
@@ -99,32 +114,65 @@ if not all([API_ID, API_HASH, PHONE_NUMBER, TARGET_CHANNELS]):
 
 client = TelegramClient(str(SESSION_PATH), API_ID, API_HASH)
 
-# Global shutdown flag
-shutdown_requested = False
+# In-memory cache of per-channel index data, keyed by channel directory
+# name. Entries carry the file mtime they were read from (or written at):
+# compact.py rewrites index.json nightly when it folds segments, so the
+# cache is only trusted while the mtime still matches.
+INDEX_CACHE: Dict[str, tuple] = {}
+
+# Per-channel record of the IDs appended to today's segment, so monitor
+# ticks don't re-append messages already on disk
+_segment_ids: Dict[str, Dict[str, Any]] = {}
+
+# All history fetches share one MTProto connection; the semaphore caps how
+# many iterators compete for it at once, and the per-channel locks keep a
+# channel's monitor and backfill tasks from interleaving fetches and index
+# writes. Both are created in main so they bind to the running event loop.
+fetch_semaphore: Optional[asyncio.Semaphore] = None
+channel_locks: Dict[str, asyncio.Lock] = {}
+MAX_CONCURRENT_FETCHES = 4
 
+# Set on SIGINT/SIGTERM; the interval sleeps wait on it, so shutdown
+# interrupts them immediately instead of running out the timer (created
+# in main so it binds to the running event loop)
+shutdown_event: Optional[asyncio.Event] = None
 
-def signal_handler(sig, frame):
+
+def request_shutdown(sig: int) -> None:
     """Handle shutdown signals gracefully"""
-    global shutdown_requested
     logger.info(f"Received signal {sig}. Initiating graceful shutdown...")
-    shutdown_requested = True
+    shutdown_event.set()
 
 
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+async def wait_or_shutdown(seconds: float) -> None:
+    """Sleep up to `seconds`, returning early if shutdown is requested"""
+    try:
+        await asyncio.wait_for(shutdown_event.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
 
 
 def load_index(channel_path: Path) -> Dict[str, Any]:
-    """Load index.json for a channel"""
+    """Load index.json for a channel, preferring the in-memory cache"""
     index_file = channel_path / 'index.json'
-    if index_file.exists():
+    try:
+        mtime_ns = index_file.stat().st_mtime_ns
+    except OSError:
+        mtime_ns = None
+
+    cached = INDEX_CACHE.get(channel_path.name)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    if mtime_ns is not None:
         try:
-            with open(index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+            index_data = orjson.loads(index_file.read_bytes())
+            INDEX_CACHE[channel_path.name] = (mtime_ns, index_data)
+            return index_data
+        except orjson.JSONDecodeError:
             logger.warning(f"index.json corrupted in {channel_path}")
 
-    return {
+    index_data = {
         'channel_username': channel_path.name,
         'total_posts_archived': 0,
         'last_known_id': 0,
@@ -140,25 +188,93 @@ def load_index(channel_path: Path) -> Dict[str, Any]:
             'last_check': None
         }
     }
+    INDEX_CACHE[channel_path.name] = (mtime_ns, index_data)
+    return index_data
 
 
 def save_index(channel_path: Path, index_data: Dict[str, Any]) -> None:
-    """Save index.json for a channel"""
+    """Save index.json for a channel and refresh the in-memory cache"""
     index_file = channel_path / 'index.json'
-    with open(index_file, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
+    index_file.write_bytes(orjson.dumps(index_data, option=orjson.OPT_INDENT_2, default=_json_default))
+    INDEX_CACHE[channel_path.name] = (index_file.stat().st_mtime_ns, index_data)
+
 
+# Reusable zstd compressors - construction is not free, share them. The
+# objects are not thread-safe and saves run on worker threads via
+# asyncio.to_thread, so keep one per thread.
+_zstd_local = threading.local()
 
-def load_gzip_json(filepath: Path) -> Dict[str, Any]:
-    """Load data from .json.gz file"""
-    with gzip.open(filepath, 'rt', encoding='utf-8') as f:
-        return json.load(f)
 
+def _get_compressor() -> zstandard.ZstdCompressor:
+    compressor = getattr(_zstd_local, 'compressor', None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=3)
+    return compressor
 
-def save_gzip_json(filepath: Path, data: Dict[str, Any]) -> None:
-    """Save data to .json.gz file"""
-    with gzip.open(filepath, 'wt', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
+
+def append_jsonl_segment(filepath: Path, messages: List[Dict[str, Any]]) -> None:
+    """
+    Append messages to a .jsonl.zst segment file as one zstd frame.
+
+    zstd frames concatenate cleanly, so each append just adds a new frame
+    to the end of the file - no read-modify-write of the day's data. The
+    nightly compaction job (compact.py) folds finished segments into a
+    single deduplicated .json.zst archive.
+    """
+    with open(filepath, 'ab') as raw:
+        with _get_compressor().stream_writer(raw) as f:
+            for msg in messages:
+                f.write(orjson.dumps(msg, default=_json_default))
+                f.write(b'\n')
+
+
+def build_message_record(message) -> Dict[str, Any]:
+    """Convert a Telethon message into the archived record dict"""
+    # Pull each attribute once; getattr with a default replaces the paired
+    # hasattr-then-access lookups the old inline dicts repeated per message
+    edit_date = message.edit_date
+    media = message.media
+    reactions = message.reactions
+    fwd = message.fwd_from
+
+    if fwd is not None:
+        fwd_id = getattr(fwd, 'from_id', None)
+        fwd_date = getattr(fwd, 'date', None)
+        fwd_from = {
+            'from_id': str(fwd_id) if fwd_id is not None else None,
+            'from_name': getattr(fwd, 'from_name', None),
+            'date': fwd_date.isoformat() if fwd_date else None
+        }
+    else:
+        fwd_from = None
+
+    record = {
+        'id': message.id,
+        'date': message.date.isoformat(),
+        'text': message.text,
+        'views': message.views,
+        'forwards': message.forwards,
+        'edit_date': edit_date.isoformat() if edit_date else None,
+        'reactions': [
+            {
+                'emoji': getattr(r.reaction, 'emoticon', None),
+                'type': type(r.reaction).__name__,
+                'count': r.count
+            }
+            for r in reactions.results
+        ] if reactions else [],
+        'has_media': media is not None,
+        'media_type': type(media).__name__ if media else None,
+        'fwd_from': fwd_from
+    }
+    # message.to_dict() walks the whole TL tree and is the costliest call
+    # per message. Store the Message object itself and let the orjson
+    # default hook dict-ify it at serialization time - that runs on the
+    # save worker thread instead of the fetch loop, and messages dropped
+    # as duplicates before the append never pay for it at all
+    if STORE_RAW:
+        record['raw'] = message
+    return record
 
 
 async def fetch_new_messages(channel_username: str, last_known_id: int) -> List[Dict[str, Any]]:
@@ -167,47 +283,59 @@ async def fetch_new_messages(channel_username: str, last_known_id: int) -> List[
     Used for continuous monitoring.
     """
     messages_data = []
+    max_id = 0  # Telethon treats 0 as "no upper bound"
+    yield_tick = 100
+    retry_count = 0
+    max_retries = 3
+
+    # Retry iteratively instead of recursing: the resume max_id moves just
+    # below what we already hold, so nothing is re-fetched and the
+    # collected batch survives the wait
+    while True:
+        try:
+            # Fetch without limit to get all new messages
+            async with fetch_semaphore:
+                async for message in client.iter_messages(channel_username, min_id=last_known_id, max_id=max_id):
+                    if not message or (message.text is None and message.media is None):
+                        continue
+
+                    messages_data.append(build_message_record(message))
+
+                    # Telethon hands over messages 100 at a time; record
+                    # building between its network awaits runs without a
+                    # suspension point, so yield periodically to keep the
+                    # other channels' tasks serviced
+                    yield_tick -= 1
+                    if not yield_tick:
+                        yield_tick = 100
+                        await asyncio.sleep(0)
+
+        except FloodWaitError as e:
+            if retry_count >= max_retries:
+                logger.error(
+                    f"[{channel_username}] Giving up after {max_retries} flood waits; "
+                    f"keeping {len(messages_data)} messages for this tick"
+                )
+                break
+            # Back off a little harder on each consecutive flood wait
+            actual_wait = e.seconds * 1.5 ** retry_count
+            retry_count += 1
+            logger.warning(f"[{channel_username}] FloodWaitError: waiting {actual_wait:.1f}s")
+            await asyncio.sleep(actual_wait)
+            if messages_data:
+                # The iteration descends from the newest message, so it
+                # stopped just below the smallest ID we hold - continue
+                # downward from there. Raising min_id instead would skip
+                # the still-unfetched range above last_known_id for good
+                # once the index advances past it; anything newer than the
+                # collected batch is the next tick's job. Appends stay
+                # strictly descending, so the tail holds the minimum
+                max_id = messages_data[-1]['id']
+            continue
+        except Exception as e:
+            logger.error(f"[{channel_username}] Error fetching new messages: {e}", exc_info=True)
 
-    try:
-        # Fetch without limit to get all new messages
-        async for message in client.iter_messages(channel_username, min_id=last_known_id):
-            if not message or (message.text is None and message.media is None):
-                continue
-
-            message_dict = message.to_dict()
-            message_data = {
-                'id': message.id,
-                'date': message.date.isoformat(),
-                'text': message.text,
-                'views': message.views,
-                'forwards': message.forwards,
-                'edit_date': message.edit_date.isoformat() if message.edit_date else None,
-                'reactions': [
-                    {
-                        'emoji': r.reaction.emoticon if hasattr(r.reaction, 'emoticon') else None,
-                        'type': r.reaction.__class__.__name__,
-                        'count': r.count
-                    }
-                    for r in message.reactions.results
-                ] if message.reactions else [],
-                'has_media': message.media is not None,
-                'media_type': message.media.__class__.__name__ if message.media else None,
-                'fwd_from': {
-                    'from_id': str(message.fwd_from.from_id) if message.fwd_from and hasattr(message.fwd_from, 'from_id') else None,
-                    'from_name': message.fwd_from.from_name if message.fwd_from and hasattr(message.fwd_from, 'from_name') else None,
-                    'date': message.fwd_from.date.isoformat() if message.fwd_from and hasattr(message.fwd_from, 'date') else None
-                } if message.fwd_from else None,
-                'raw': message_dict
-            }
-            messages_data.append(message_data)
-
-    except FloodWaitError as e:
-        logger.warning(f"[{channel_username}] FloodWaitError: waiting {e.seconds}s")
-        await asyncio.sleep(e.seconds)
-        # Retry once
-        return await fetch_new_messages(channel_username, last_known_id)
-    except Exception as e:
-        logger.error(f"[{channel_username}] Error fetching new messages: {e}", exc_info=True)
+        break
 
     return messages_data
 
@@ -218,41 +346,24 @@ async def fetch_old_messages(channel_username: str, min_known_id: int, limit: in
     Used for periodic backfill.
     """
     messages_data = []
+    yield_tick = 100
 
     try:
-        async for message in client.iter_messages(channel_username, max_id=min_known_id, limit=limit):
-            if not message or (message.text is None and message.media is None):
-                continue
-
-            message_dict = message.to_dict()
-            message_data = {
-                'id': message.id,
-                'date': message.date.isoformat(),
-                'text': message.text,
-                'views': message.views,
-                'forwards': message.forwards,
-                'edit_date': message.edit_date.isoformat() if message.edit_date else None,
-                'reactions': [
-                    {
-                        'emoji': r.reaction.emoticon if hasattr(r.reaction, 'emoticon') else None,
-                        'type': r.reaction.__class__.__name__,
-                        'count': r.count
-                    }
-                    for r in message.reactions.results
-                ] if message.reactions else [],
-                'has_media': message.media is not None,
-                'media_type': message.media.__class__.__name__ if message.media else None,
-                'fwd_from': {
-                    'from_id': str(message.fwd_from.from_id) if message.fwd_from and hasattr(message.fwd_from, 'from_id') else None,
-                    'from_name': message.fwd_from.from_name if message.fwd_from and hasattr(message.fwd_from, 'from_name') else None,
-                    'date': message.fwd_from.date.isoformat() if message.fwd_from and hasattr(message.fwd_from, 'date') else None
-                } if message.fwd_from else None,
-                'raw': message_dict
-            }
-            messages_data.append(message_data)
+        async with fetch_semaphore:
+            async for message in client.iter_messages(channel_username, max_id=min_known_id, limit=limit):
+                if not message or (message.text is None and message.media is None):
+                    continue
+
+                messages_data.append(build_message_record(message))
+
+                if len(messages_data) % 500 == 0:
+                    logger.info(f"[{channel_username}] Backfill progress: {len(messages_data)}/{limit}")
 
-            if len(messages_data) % 500 == 0:
-                logger.info(f"[{channel_username}] Backfill progress: {len(messages_data)}/{limit}")
+                # Same fairness yield as the monitor fetch
+                yield_tick -= 1
+                if not yield_tick:
+                    yield_tick = 100
+                    await asyncio.sleep(0)
 
     except FloodWaitError as e:
         logger.warning(f"[{channel_username}] FloodWaitError during backfill: waiting {e.seconds}s")
@@ -264,7 +375,7 @@ async def fetch_old_messages(channel_username: str, min_known_id: int, limit: in
 
 
 def save_messages(channel_path: Path, messages: List[Dict[str, Any]], index: Dict[str, Any]) -> None:
-    """Save messages to daily file and update index"""
+    """Append messages to today's segment file and update index"""
     if not messages:
         return
 
@@ -273,46 +384,30 @@ def save_messages(channel_path: Path, messages: List[Dict[str, Any]], index: Dic
 
     # Filename for today's data
     today_str = date.today().isoformat()
-    output_filename = channel_path / f"{today_str}.json.gz"
+    output_filename = channel_path / f"{today_str}.jsonl.zst"
 
-    # Load existing messages from today's file if it exists
-    existing_messages = []
-    if output_filename.exists():
-        try:
-            file_data = load_gzip_json(output_filename)
-            if isinstance(file_data, dict) and 'messages' in file_data:
-                existing_messages = file_data['messages']
-            elif isinstance(file_data, list):
-                existing_messages = file_data
-        except Exception as e:
-            logger.warning(f"Failed to load {output_filename}: {e}")
-
-    # Merge and deduplicate
-    all_messages = existing_messages + messages
-    unique_messages = {msg['id']: msg for msg in all_messages}.values()
-    unique_messages = sorted(unique_messages, key=lambda x: x['id'])
-
-    # Create file data with metadata
-    min_id = min(msg['id'] for msg in messages)
-    max_id = max(msg['id'] for msg in messages)
-
-    file_data = {
-        'metadata': {
-            'collection_timestamp': datetime.now().isoformat(),
-            'channel_username': index['channel_username'],
-            'total_messages': len(unique_messages),
-            'min_id_in_batch': min_id,
-            'max_id_in_batch': max_id,
-            'date': today_str
-        },
-        'messages': list(unique_messages)
-    }
+    # IDs already appended today, kept in memory per channel. After a
+    # daemon restart the set starts empty; any duplicate appends that
+    # causes are folded away when compaction dedups the segment
+    day_state = _segment_ids.get(channel_path.name)
+    if day_state is None or day_state['date'] != today_str:
+        day_state = {'date': today_str, 'ids': set()}
+        _segment_ids[channel_path.name] = day_state
+    known_ids = day_state['ids']
 
-    # Save to .json.gz
-    save_gzip_json(output_filename, file_data)
+    if known_ids:
+        messages = [m for m in messages if m['id'] not in known_ids]
+        if not messages:
+            return
+
+    append_jsonl_segment(output_filename, messages)
+    known_ids.update(m['id'] for m in messages)
 
     # Update index
-    new_count = len([m for m in messages if m['id'] not in [em['id'] for em in existing_messages]])
+    new_count = len(messages)
+    min_id = messages[0]['id']
+    max_id = messages[-1]['id']
+
     index['total_posts_archived'] += new_count
     index['last_known_id'] = max(max_id, index.get('last_known_id', 0))
 
@@ -324,27 +419,27 @@ def save_messages(channel_path: Path, messages: List[Dict[str, Any]], index: Dic
     index['last_updated'] = datetime.now().isoformat()
 
     # Update first and last post dates
-    if messages:
-        first_msg_date = messages[0]['date']
-        last_msg_date = messages[-1]['date']
-
-        if index['first_post_date'] is None or first_msg_date < index['first_post_date']:
-            index['first_post_date'] = first_msg_date
-        if index['last_post_date'] is None or last_msg_date > index['last_post_date']:
-            index['last_post_date'] = last_msg_date
-
-    # Update data_files info
-    file_info = {
-        'filename': output_filename.name,
-        'date': today_str,
-        'posts_count': len(unique_messages)
-    }
-
-    existing_file_index = next((i for i, f in enumerate(index['data_files']) if f['filename'] == output_filename.name), None)
-    if existing_file_index is not None:
-        index['data_files'][existing_file_index] = file_info
+    first_msg_date = messages[0]['date']
+    last_msg_date = messages[-1]['date']
+
+    if index['first_post_date'] is None or first_msg_date < index['first_post_date']:
+        index['first_post_date'] = first_msg_date
+    if index['last_post_date'] is None or last_msg_date > index['last_post_date']:
+        index['last_post_date'] = last_msg_date
+
+    # Update data_files info. Counts accumulate across appends within a
+    # day; compaction recomputes the exact figure when it folds the
+    # segment. data_files grows chronologically, so today's entry - when
+    # it exists - is always the last one
+    data_files = index['data_files']
+    if data_files and data_files[-1]['filename'] == output_filename.name:
+        data_files[-1]['posts_count'] += new_count
     else:
-        index['data_files'].append(file_info)
+        data_files.append({
+            'filename': output_filename.name,
+            'date': today_str,
+            'posts_count': new_count
+        })
 
     save_index(channel_path, index)
 
@@ -359,26 +454,41 @@ async def monitor_channel(channel_username: str):
 
     logger.info(f"[{channel_username}] Starting continuous monitoring (interval: {MONITOR_INTERVAL}s)")
 
-    while not shutdown_requested:
-        try:
-            index = load_index(channel_path)
-            last_known_id = index['last_known_id']
-
-            # Fetch new messages
-            new_messages = await fetch_new_messages(channel_username, last_known_id)
+    # Quiet channels double their poll interval per empty check (capped at
+    # MAX_MONITOR_INTERVAL) and snap back to the base interval on activity,
+    # so dead channels stop burning API quota every two minutes
+    consecutive_empty_polls = 0
 
-            if new_messages:
-                logger.info(f"[{channel_username}] Found {len(new_messages)} new messages")
-                save_messages(channel_path, new_messages, index)
-                logger.info(f"[{channel_username}] Saved new messages. Total: {index['total_posts_archived']}")
-            else:
-                logger.debug(f"[{channel_username}] No new messages")
+    while not shutdown_event.is_set():
+        try:
+            # Hold the channel lock across fetch + save so a concurrent
+            # backfill of the same channel can't race on the index
+            async with channel_locks[channel_username]:
+                index = await asyncio.to_thread(load_index, channel_path)
+                last_known_id = index['last_known_id']
+
+                # Fetch new messages
+                new_messages = await fetch_new_messages(channel_username, last_known_id)
+
+                if new_messages:
+                    logger.info(f"[{channel_username}] Found {len(new_messages)} new messages")
+                    # Compression and disk writes block; run them on a
+                    # worker thread so other channels keep fetching
+                    await asyncio.to_thread(save_messages, channel_path, new_messages, index)
+                    logger.info(f"[{channel_username}] Saved new messages. Total: {index['total_posts_archived']}")
+                    consecutive_empty_polls = 0
+                else:
+                    logger.debug(f"[{channel_username}] No new messages")
+                    if consecutive_empty_polls < 8:
+                        consecutive_empty_polls += 1
 
         except Exception as e:
             logger.error(f"[{channel_username}] Error in monitor loop: {e}", exc_info=True)
 
         # Sleep before next check
-        await asyncio.sleep(MONITOR_INTERVAL)
+        await wait_or_shutdown(
+            min(MONITOR_INTERVAL * 2 ** consecutive_empty_polls, MAX_MONITOR_INTERVAL)
+        )
 
 
 async def backfill_channel(channel_username: str):
@@ -391,36 +501,50 @@ async def backfill_channel(channel_username: str):
 
     logger.info(f"[{channel_username}] Starting backfill scheduler (interval: {BACKFILL_INTERVAL/3600:.1f}h)")
 
-    while not shutdown_requested:
+    while not shutdown_event.is_set():
         try:
-            index = load_index(channel_path)
-            min_known_id = index.get('min_known_id')
-
-            # Skip if we've reached the beginning
-            if min_known_id and min_known_id > 1:
-                logger.info(f"[{channel_username}] Starting backfill (ID < {min_known_id})")
-
-                old_messages = await fetch_old_messages(channel_username, min_known_id, BACKFILL_LIMIT)
-
-                if old_messages:
-                    logger.info(f"[{channel_username}] Backfilled {len(old_messages)} old messages")
-                    save_messages(channel_path, old_messages, index)
-                    index['last_backfill'] = datetime.now().isoformat()
-                    save_index(channel_path, index)
+            async with channel_locks[channel_username]:
+                index = await asyncio.to_thread(load_index, channel_path)
+                min_known_id = index.get('min_known_id')
+
+                # Skip if we've reached the beginning
+                if min_known_id and min_known_id > 1:
+                    logger.info(f"[{channel_username}] Starting backfill (ID < {min_known_id})")
+
+                    old_messages = await fetch_old_messages(channel_username, min_known_id, BACKFILL_LIMIT)
+
+                    if old_messages:
+                        logger.info(f"[{channel_username}] Backfilled {len(old_messages)} old messages")
+                        await asyncio.to_thread(save_messages, channel_path, old_messages, index)
+                        # save_messages just stamped last_updated; reuse it
+                        index['last_backfill'] = index['last_updated']
+                        await asyncio.to_thread(save_index, channel_path, index)
+                    else:
+                        logger.info(f"[{channel_username}] Backfill complete - reached beginning of channel")
                 else:
-                    logger.info(f"[{channel_username}] Backfill complete - reached beginning of channel")
-            else:
-                logger.info(f"[{channel_username}] Backfill skipped - no min_known_id or reached beginning")
+                    logger.info(f"[{channel_username}] Backfill skipped - no min_known_id or reached beginning")
 
         except Exception as e:
             logger.error(f"[{channel_username}] Error in backfill: {e}", exc_info=True)
 
         # Sleep until next backfill
-        await asyncio.sleep(BACKFILL_INTERVAL)
+        await wait_or_shutdown(BACKFILL_INTERVAL)
 
 
 async def main():
     """Main daemon loop"""
+    global fetch_semaphore, shutdown_event
+    fetch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    shutdown_event = asyncio.Event()
+    for channel in TARGET_CHANNELS:
+        channel_locks[channel] = asyncio.Lock()
+
+    # Loop-level handlers wake the event from inside the loop; the old
+    # signal.signal flag was only noticed once a 6h backfill sleep expired
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, request_shutdown, sig)
+
     logger.info("=" * 60)
     logger.info("Z-Words Collector Daemon Starting")
     logger.info("=" * 60)